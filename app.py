@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, date
+from collections import deque
+from functools import lru_cache
+import json
+import os
+import tempfile
+import threading
 import time
 
 # =========================
@@ -13,27 +20,30 @@ st.set_page_config(page_title="TFSA Tracker", page_icon="🧮", layout="wide")
 # -------------------------
 def init_state():
     defaults = {
-        "transactions": [],         # list of dicts with id, date, type, amount
-        "next_id": 1,               # autoincrement id for transaction rows
+        "transactions": empty_txns(),  # column store: parallel id / date / type / amount arrays
+        "txn_version": 0,           # bumped on every add/delete/clear (cache key for derived data)
         "ever_contributed": "No",   # default for estimator
         "carryover_manual": 0.0,    # manual carryover when ever_contributed == "Yes"
         "amount_input": 0.0,        # form inputs (helps reset)
         "type_input": "deposit",
         "log_open": True,           # remember expander state for Logged transactions
-        "show_table_open": False,   # remember expander state for monthly table
         "confirming_clear": False,  # inline confirm for clear-all
+        "fx_queue": deque(maxlen=3),  # recent emoji bursts ({emoji, ts}) next to the Add button
+        "data_stamp": None,         # DATA_FILE (inode, mtime, size) this session's transactions were read at
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
-
-init_state()
+    if DATA_FILE:
+        sync_from_file()
 
 # -------------------------
 # Compact / UI tweaks (CSS)
 # -------------------------
-st.markdown(
-    """
+# Static, so it lives in one module-level constant. It is still emitted on every
+# run: Streamlit drops elements a rerun doesn't re-emit, so a "send once" guard
+# would strip the styles after the first interaction.
+APP_CSS = """
     <style>
       /* tighten the huge top gap under the H1 */
       section.main > div:first-child { padding-top: 0.25rem !important; }
@@ -56,9 +66,13 @@ st.markdown(
           overflow: hidden;
       }
       .room-fill {
+          /* full-width fill slid left by the unused share: animating transform
+             stays on the compositor, unlike animating width (layout + paint) */
+          width: 100%;
           height: 100%;
           border-radius: 999px;
-          transition: width 600ms ease;
+          transition: transform 600ms ease;
+          will-change: transform;
           box-shadow: none;
       }
       .room-fill.glow {
@@ -78,13 +92,31 @@ st.markdown(
           color: #efecc2;
       }
 
+      /* Emoji burst next to the Add button (fades out over FX_DURATION) */
+      .fx {
+          display: inline-block;
+          font-size: 28px;
+          animation: fx-burst 1s ease-out forwards;
+          will-change: transform, opacity;
+      }
+      @keyframes fx-burst {
+          from { opacity: 1; transform: translateY(0) scale(1); }
+          to   { opacity: 0; transform: translateY(-10px) scale(1.2); }
+      }
+
+      /* Respect the OS reduced-motion setting: no burst / bar animation at all */
+      @media (prefers-reduced-motion: reduce) {
+          .fx, .room-fill { animation: none !important; transition: none !important; }
+          .fx { opacity: 0; }
+      }
+
       /* Align numbers in monthly table left (Streamlit centers by default) */
       .stDataFrame tbody td div { justify-content: flex-start !important; }
 
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+"""
+
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # -------------------------
 # Constants / Helpers
@@ -96,78 +128,255 @@ LIMITS_BY_YEAR = {
     2024: 7000, 2025: 7000,
 }
 
+# Cumulative limits by year (0 where no limit applies), built once at import so
+# room-from-inception is two array lookups instead of a per-year Python loop.
+CUM_FIRST_YEAR, CUM_LAST_YEAR = 1900, 2100
+CUM_LIMITS = np.cumsum([LIMITS_BY_YEAR.get(y, 0) for y in range(CUM_FIRST_YEAR, CUM_LAST_YEAR + 1)])
+
+TYPE_LABELS = {"deposit": "💵 Deposit", "withdrawal": "🔻 Withdrawal"}
+TXN_TYPES = ("deposit", "withdrawal")  # position = type code in the column store
+TYPE_LABELS_BY_CODE = np.array([TYPE_LABELS[k] for k in TXN_TYPES])
+
+FX_DURATION = 1.0  # seconds an emoji burst stays queued (matches the .fx animation)
+
+# Optional on-disk log (JSON). Unset -> transactions live only in the session.
+DATA_FILE = os.environ.get("TFSA_DATA_FILE")
+
 def tfsa_start_year_from_dob(dob: date) -> int:
     # TFSA starts at the later of 2009 or the year you turn 18
     return max(dob.year + 18, 2009)
 
+@lru_cache(maxsize=None)
+def room_between(start_year: int, through_year: int) -> float:
+    if through_year < start_year:
+        return 0.0
+    through_year = min(through_year, CUM_LAST_YEAR)
+    # prefix-sum difference: limits for start_year..through_year inclusive
+    return float(CUM_LIMITS[through_year - CUM_FIRST_YEAR] - CUM_LIMITS[start_year - 1 - CUM_FIRST_YEAR])
+
 def total_room_from_inception(dob: date, through_year: int) -> float:
-    start = tfsa_start_year_from_dob(dob)
-    return float(sum(LIMITS_BY_YEAR.get(y, 0) for y in range(start, through_year + 1)))
+    # only the start year (from dob.year) matters, so the memo key stays tiny
+    return room_between(tfsa_start_year_from_dob(dob), through_year)
 
 def current_year_limit(year: int) -> float:
     return float(LIMITS_BY_YEAR.get(year, 0))
 
-def df_from_txns(txns: list) -> pd.DataFrame:
-    if not txns:
-        return pd.DataFrame(columns=["id", "date", "type", "amount", "year", "month"])
-    df = pd.DataFrame(txns)
-    df["date"] = pd.to_datetime(df["date"])
-    df["year"] = df["date"].dt.year
-    df["month"] = df["date"].dt.to_period("M").astype(str)
-    return df
-
-def current_year_deposits(df: pd.DataFrame, year: int) -> float:
-    if df.empty:
-        return 0.0
-    filt = (df["year"] == year) & (df["type"] == "deposit")
-    return float(df.loc[filt, "amount"].sum())
+def make_txn(txn_id: int, iso_date: str, kind: str, amount: float) -> dict:
+    return {"id": txn_id, "date": iso_date, "type": kind, "amount": float(amount)}
+
+def empty_txns() -> dict:
+    # One array per field instead of a dict per row: compact, and frames/aggregates
+    # are built straight from the arrays
+    return {
+        "id": np.empty(0, np.int32),
+        "date": np.empty(0, "datetime64[D]"),
+        "type": np.empty(0, np.uint8),       # index into TXN_TYPES
+        "amount": np.empty(0, np.float64),   # float64: float32 loses cents past ~$100k
+    }
 
-def lifetime_balance(df: pd.DataFrame) -> float:
-    if df.empty:
-        return 0.0
-    deposits = float(df.loc[df["type"] == "deposit", "amount"].sum()) if "type" in df else 0.0
-    withdrawals = float(df.loc[df["type"] == "withdrawal", "amount"].sum()) if "type" in df else 0.0
-    return deposits - withdrawals
+def txn_count() -> int:
+    return len(st.session_state.transactions["id"])
+
+def append_txns(cols: dict, txns: list) -> dict:
+    """New column store with make_txn() records appended to `cols`."""
+    return {
+        "id": np.append(cols["id"], np.array([t["id"] for t in txns], np.int32)),
+        "date": np.append(cols["date"], np.array([t["date"] for t in txns], "datetime64[D]")),
+        "type": np.append(cols["type"], np.array([TXN_TYPES.index(t["type"]) for t in txns], np.uint8)),
+        "amount": np.append(cols["amount"], np.array([t["amount"] for t in txns], np.float64)),
+    }
+
+def next_txn_id(cols: dict) -> int:
+    return int(cols["id"].max()) + 1 if len(cols["id"]) else 1
+
+@st.cache_resource(show_spinner=False)
+def data_file_lock() -> threading.Lock:
+    # One lock per server process, shared by every session (module globals are
+    # rebuilt on each run, so it has to live in cache_resource)
+    return threading.Lock()
+
+def data_file_stamp():
+    # Every save os.replace()s a fresh temp file, so the inode changes even when a
+    # coarse-timestamp filesystem gives two saves the same mtime
+    try:
+        info = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        return None
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+def load_txns(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        return append_txns(empty_txns(), [make_txn(r["id"], r["date"], r["type"], r["amount"]) for r in rows])
+    except FileNotFoundError:
+        return empty_txns()
+    except (ValueError, KeyError, TypeError):
+        # Unreadable (JSONDecodeError is a ValueError): set it aside rather than crash
+        # every session or overwrite it on the next save
+        quarantine = f"{path}.corrupt-{time.time_ns()}"
+        os.replace(path, quarantine)
+        st.session_state.data_warning = f"Couldn't read {path}; it was moved to {quarantine} and the log starts empty."
+        return empty_txns()
+
+def save_txns(cols: dict):
+    # Plain JSON of the stored fields, written to a uniquely named temp file in the same
+    # directory and then os.replace()d, so a crash mid-write can't truncate the saved log
+    rows = [
+        {"id": int(i), "date": str(d), "type": TXN_TYPES[k], "amount": float(a)}
+        for i, d, k, a in zip(cols["id"], cols["date"], cols["type"], cols["amount"])
+    ]
+    tmp = tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(DATA_FILE)),
+        prefix=os.path.basename(DATA_FILE) + ".", suffix=".tmp", delete=False,
+    )
+    try:
+        with tmp:
+            json.dump(rows, tmp)
+        os.replace(tmp.name, DATA_FILE)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+def sync_from_file():
+    # Pick up changes other sessions wrote since this session last read the file
+    # (one stat per run; the file is only re-read when it changed)
+    if data_file_stamp() == st.session_state.data_stamp:
+        return
+    with data_file_lock():
+        st.session_state.data_stamp = data_file_stamp()
+        st.session_state.transactions = load_txns(DATA_FILE)
+    st.session_state.txn_version += 1
+
+def commit_txns(update):
+    """Apply update(cols) -> cols to the transaction log and show the result in this session.
+
+    With DATA_FILE set, the update runs against the file's current contents under the
+    process-wide lock and is saved before the lock is released, so sessions sharing the
+    file never drop each other's changes or hand out the same id.
+    """
+    if DATA_FILE:
+        with data_file_lock():
+            cols = update(load_txns(DATA_FILE))
+            save_txns(cols)
+            st.session_state.data_stamp = data_file_stamp()
+    else:
+        cols = update(st.session_state.transactions)
+    st.session_state.transactions = cols
+    st.session_state.txn_version += 1
+
+def month_label(month_key: int) -> str:
+    return f"{month_key // 100}-{month_key % 100:02d}"
+
+def cached_on_version(name: str, build, extra_key=None):
+    """Session-cached build() result, recomputed only when txn_version (or extra_key) changes."""
+    key = (st.session_state.txn_version, extra_key)
+    entry = st.session_state.get(name)
+    if entry is None or entry[0] != key:
+        entry = (key, build())
+        st.session_state[name] = entry
+    return entry[1]
+
+def txn_sums(cols: dict):
+    """({(year, type): amount}, {month_key: [deposit, withdrawal]}) from one pass over the columns."""
+    # bin on (months since 1970-01) * 2 + type code, then fold months into years
+    months = cols["date"].astype("datetime64[M]").astype(np.int64)
+    keys, inverse = np.unique(months * 2 + cols["type"], return_inverse=True)
+    sums = np.bincount(inverse, weights=cols["amount"], minlength=len(keys))
+    by_year, by_month = {}, {}
+    for key, amt in zip(keys.tolist(), sums.tolist()):
+        month_idx, code = divmod(key, 2)
+        year, month0 = divmod(month_idx, 12)
+        year += 1970
+        by_year[(year, TXN_TYPES[code])] = by_year.get((year, TXN_TYPES[code]), 0.0) + amt
+        by_month.setdefault(year * 100 + month0 + 1, [0.0, 0.0])[code] = amt
+    return by_year, by_month
+
+def get_sums():
+    return cached_on_version("_sums_cache", lambda: txn_sums(st.session_state.transactions))
+
+def get_totals() -> dict:
+    return get_sums()[0]
+
+def build_monthly(year: int) -> pd.DataFrame:
+    """Month-indexed deposit/withdrawal sums for `year` (months with activity only)."""
+    rows = [
+        (month_label(mk), dep, wd)
+        for mk, (dep, wd) in sorted(get_sums()[1].items())
+        if mk // 100 == year
+    ]
+    return pd.DataFrame(rows, columns=["month", "deposit", "withdrawal"]).set_index("month")
+
+def get_monthly(year: int) -> pd.DataFrame:
+    return cached_on_version("_monthly_cache", lambda: build_monthly(year), extra_key=year)
+
+def current_year_deposits(totals: dict, year: int) -> float:
+    return float(totals.get((year, "deposit"), 0.0))
+
+def lifetime_balance(totals: dict) -> float:
+    return float(sum(amt if kind == "deposit" else -amt for (_, kind), amt in totals.items()))
+
+FILL_COLORS = ("#22c55e", "#fbbf24", "#ef4444")  # green -> amber -> red
 
 def color_for_pct(p: float) -> str:
     """Return a hex for the fill based on used%."""
-    # green -> yellow -> red
-    if p < 60:
-        return "#22c55e"   # green
-    elif p < 85:
-        return "#fbbf24"   # amber
-    else:
-        return "#ef4444"   # red
+    # thresholds summed as bools give the bucket index: <60, <85, >=85
+    return FILL_COLORS[(p >= 60) + (p >= 85)]
 
 def glow_needed(p: float) -> bool:
     return p >= 92.0
 
+ROOM_BAR_TMPL = """
+    <div class="room-line"><div>Contribution room used</div><div>{pct:.1f}%</div></div>
+    <div class="room-wrap">
+      <div class="room-fill {glow_cls}" style="transform:translateX(-{offset:.1f}%); background:{color};"></div>
+    </div>
+    """
+
+@lru_cache(maxsize=64)
+def room_bar_html(pct: float) -> str:
+    """Progress bar markup for a used% (pass it rounded to 0.1, as displayed, so reruns hit the memo)."""
+    return ROOM_BAR_TMPL.format(
+        pct=pct,
+        glow_cls="glow" if glow_needed(pct) else "",
+        offset=100 - min(pct, 100),
+        color=color_for_pct(pct),
+    )
+
 def annual_limits_df():
     rows = [{"Year": y, "Limit ($)": f"${LIMITS_BY_YEAR[y]:,}"} for y in sorted(LIMITS_BY_YEAR)]
     return pd.DataFrame(rows)
 
+# Static explainer content, built once at import instead of on every rerun
+ANNUAL_LIMITS_DF = annual_limits_df()
+ANNUAL_LIMITS_HEADING = f"**Full annual TFSA limits ({min(LIMITS_BY_YEAR)} → {max(LIMITS_BY_YEAR)}):**"
+EXPLAINER_MD = """
+**Key rules (simplified):**
+- Your TFSA room starts accruing from the year you turn **18** (or **2009**, whichever is later).
+- **Deposits** reduce this year’s available room.
+- **Withdrawals** do **not** give room back until **January 1 of the next year**.
+- CRA is the source of truth. This app is an educational helper; confirm with CRA if you’re unsure.
+"""
+
+init_state()
+
 # =========================
 # --------- UI ------------
 # =========================
 st.title("TFSA Contribution Tracker")
 
+if "data_warning" in st.session_state:
+    st.warning(st.session_state.pop("data_warning"))
+
 current_year = datetime.now().year
 
 # --- Estimator Header / Explainer ---
 with st.expander("ℹ️ How TFSA contribution room works", expanded=False):
-    st.markdown(
-        """
-**Key rules (simplified):**
-- Your TFSA room starts accruing from the year you turn **18** (or **2009**, whichever is later).
-- **Deposits** reduce this year’s available room.
-- **Withdrawals** do **not** give room back until **January 1 of the next year**.
-- CRA is the source of truth. This app is an educational helper; confirm with CRA if you’re unsure.
-        """
-    )
-    st.markdown("**Full annual TFSA limits (2009 → 2025):**")
+    st.markdown(EXPLAINER_MD)
+    st.markdown(ANNUAL_LIMITS_HEADING)
     st.dataframe(
-        annual_limits_df(),
-        use_container_width=True,
+        ANNUAL_LIMITS_DF,
+        width="stretch",
         hide_index=True
     )
 
@@ -187,34 +396,24 @@ if st.session_state.ever_contributed == "No":
     st.success(f"Estimated available room (all-time if you've truly never contributed): **${estimated_room_total:,.0f}**")
 else:
     # If you *have* contributed, ask for carryover
-    st.session_state.carryover_manual = st.number_input(
+    carryover_prior = st.session_state.carryover_manual = st.number_input(
         "Enter your unused TFSA room carried into this year (best estimate):",
         min_value=0.0, step=500.0, value=float(st.session_state.carryover_manual)
     )
-    estimated_room_total = st.session_state.carryover_manual + current_year_limit(current_year)
-    carryover_prior = st.session_state.carryover_manual
+    estimated_room_total = carryover_prior + current_year_limit(current_year)
     st.info(f"Estimated total room available **this year** (carryover + {current_year} limit): **${estimated_room_total:,.0f}**")
 
 # --- Top Metrics / Progress ---
-df_all = df_from_txns(st.session_state.transactions)
-deposits_ytd = current_year_deposits(df_all, current_year)
+# Built once per run and reused by the add-transaction validator below
+totals = get_totals()
+deposits_ytd = current_year_deposits(totals, current_year)
 room_used_pct = (deposits_ytd / estimated_room_total * 100.0) if estimated_room_total > 0 else 0.0
 room_left = max(0.0, estimated_room_total - deposits_ytd)
 
 st.write("")  # spacer
 
 # Custom progress bar with color + glow near full
-fill_color = color_for_pct(room_used_pct)
-glow_cls = "glow" if glow_needed(room_used_pct) else ""
-st.markdown(
-    f"""
-    <div class="room-line"><div>Contribution room used</div><div>{room_used_pct:.1f}%</div></div>
-    <div class="room-wrap">
-      <div class="room-fill {glow_cls}" style="width:{min(room_used_pct,100):.1f}%; background:{fill_color};"></div>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
+st.markdown(room_bar_html(round(room_used_pct, 1)), unsafe_allow_html=True)
 
 metric1, metric2, metric3 = st.columns(3)
 metric1.metric("This year's limit", f"${current_year_limit(current_year):,.0f}")
@@ -240,175 +439,234 @@ with st.container(border=True):
 # =========================
 st.markdown("### ➕ Add a Transaction")
 
+def validate_deposit(t_date: date, amount: float, totals: dict):
+    # Allow deposit as long as **current-year** total deposits <= total available this year.
+    # This lets a single deposit exceed the single-year limit if carryover covers it.
+    # For prior years, be conservative: cap to that year's limit minus any logged deposits for that year.
+    deposit_year = t_date.year
+    year_room = carryover_prior + current_year_limit(current_year) if deposit_year == current_year else current_year_limit(deposit_year)
+    allowed_room = max(0.0, year_room - current_year_deposits(totals, deposit_year))
+    if amount <= allowed_room:
+        return None
+    if deposit_year == current_year:
+        return f"❌ Deposit would exceed your remaining room for {deposit_year}. Available: ${allowed_room:,.0f}."
+    return f"❌ Deposit exceeds that year's limit. Available for {deposit_year}: ${allowed_room:,.0f}."
+
+def validate_withdrawal(t_date: date, amount: float, totals: dict):
+    # Withdrawal cannot exceed balance (lifetime deposits - withdrawals)
+    bal = lifetime_balance(totals)
+    if amount > bal:
+        return f"❌ Withdrawal exceeds available balance. Current balance: ${bal:,.0f}."
+    return None
+
+# type -> validator(t_date, amount, totals) returning an error message, or None if OK
+VALIDATORS = {"deposit": validate_deposit, "withdrawal": validate_withdrawal}
+FX_EMOJI = {"deposit": "💰", "withdrawal": "💸"}
+
+def add_txn(t_date: date, kind: str, amount: float):
+    iso_date = t_date.strftime("%Y-%m-%d")
+    # id is taken from the log being updated (the file's, when saving), so it stays unique
+    commit_txns(lambda cols: append_txns(cols, [make_txn(next_txn_id(cols), iso_date, kind, amount)]))
+    st.session_state.amount_input = 0.0
+    # Emoji burst right next to button – always shows on click
+    st.session_state.fx_queue.append({"emoji": FX_EMOJI[kind], "ts": time.time()})
+
 with st.form("txn_form", clear_on_submit=False):
     c1, c2, c3 = st.columns([1, 1, 1])
     with c1:
         t_date = st.date_input("Date", value=date.today(), min_value=date(2009, 1, 1), max_value=date.today())
     with c2:
-        st.session_state.type_input = st.radio("Type", ["deposit", "withdrawal"], index=(0 if st.session_state.type_input == "deposit" else 1), horizontal=True)
+        kind = st.session_state.type_input = st.radio("Type", ["deposit", "withdrawal"], index=(0 if st.session_state.type_input == "deposit" else 1), horizontal=True)
     with c3:
         t_amount = st.number_input("Amount", min_value=0.0, step=100.0, value=float(st.session_state.amount_input))
     # Add button + emoji slot to its right
     btn_col, emoji_col = st.columns([0.2, 0.8])
     with btn_col:
-        submitted = st.form_submit_button("Add", type="primary", use_container_width=True)
+        submitted = st.form_submit_button("Add", type="primary", width="stretch")
     with emoji_col:
         # placeholder where the emoji burst will appear next to the button
         emoji_slot = st.empty()
 
     if submitted:
-        df_all = df_from_txns(st.session_state.transactions)
-        if t_amount <= 0:
-            st.error("Please enter an amount greater than $0.")
+        # totals from the top of this run are still current (nothing mutates in between)
+        err = "Please enter an amount greater than $0." if t_amount <= 0 else VALIDATORS[kind](t_date, t_amount, totals)
+        if err:
+            st.error(err)
         else:
-            if st.session_state.type_input == "deposit":
-                # Allow deposit as long as **current-year** total deposits <= total available this year.
-                # This lets a single deposit exceed the single-year limit if carryover covers it.
-                deposit_year = t_date.year
-                deposits_that_year = current_year_deposits(df_all, deposit_year)
-                if deposit_year == current_year:
-                    allowed_room = max(0.0, (carryover_prior + current_year_limit(current_year)) - deposits_that_year)
-                else:
-                    # For prior years, be conservative: cap to that year's limit minus any logged deposits for that year.
-                    allowed_room = max(0.0, current_year_limit(deposit_year) - deposits_that_year)
-
-                if t_amount > allowed_room and deposit_year == current_year:
-                    st.error(f"❌ Deposit would exceed your remaining room for {deposit_year}. Available: ${allowed_room:,.0f}.")
-                elif t_amount > allowed_room and deposit_year != current_year:
-                    st.error(f"❌ Deposit exceeds that year's limit. Available for {deposit_year}: ${allowed_room:,.0f}.")
-                else:
-                    st.session_state.transactions.append({
-                        "id": st.session_state.next_id,
-                        "date": t_date.strftime("%Y-%m-%d"),
-                        "type": "deposit",
-                        "amount": float(t_amount)
-                    })
-                    st.session_state.next_id += 1
-                    st.session_state.amount_input = 0.0
-                    # Emoji burst (💰) right next to button – always shows on click
-                    emoji_slot.markdown("<div style='font-size:28px'>💰</div>", unsafe_allow_html=True)
-                    time.sleep(1.0)
-                    emoji_slot.empty()
-            else:
-                # Withdrawal cannot exceed balance (lifetime deposits - withdrawals)
-                bal = lifetime_balance(df_all)
-                if t_amount > bal:
-                    st.error(f"❌ Withdrawal exceeds available balance. Current balance: ${bal:,.0f}.")
-                else:
-                    st.session_state.transactions.append({
-                        "id": st.session_state.next_id,
-                        "date": t_date.strftime("%Y-%m-%d"),
-                        "type": "withdrawal",
-                        "amount": float(t_amount)
-                    })
-                    st.session_state.next_id += 1
-                    st.session_state.amount_input = 0.0
-                    # Emoji burst (💸) right next to button – always shows on click
-                    emoji_slot.markdown("<div style='font-size:28px'>💸</div>", unsafe_allow_html=True)
-                    time.sleep(1.0)
-                    emoji_slot.empty()
+            add_txn(t_date, kind, t_amount)
+
+    # Drop expired bursts from the left (queue is in timestamp order), render the rest
+    now = time.time()
+    fx_queue = st.session_state.fx_queue
+    while fx_queue and now - fx_queue[0]["ts"] >= FX_DURATION:
+        fx_queue.popleft()
+    if fx_queue:
+        # one markdown delta for all bursts instead of one per emoji
+        fx_html = "".join(f"<div class='fx'>{fx['emoji']}</div>" for fx in fx_queue)
+        emoji_slot.markdown(fx_html, unsafe_allow_html=True)
 
 # =========================
 # --- Logged Transactions --
 # =========================
-head_left, head_right = st.columns([1, 0.08])
-with head_left:
-    st.subheader("🧾 Logged transactions")
-    st.caption("Most recent first. Delete individual rows with the ✖ buttons.")
-
-with head_right:
-    # Bomb icon toggles confirm UI
-    if not st.session_state.confirming_clear:
-        if st.button("💣", help="Clear all transactions"):
-            st.session_state.confirming_clear = True
-    else:
-        pass  # confirmation card will render below list
+def build_log_table(cols: dict):
+    """Newest-first editor frame for the log, plus the transaction id of each row."""
+    # Sort by date (then id), so backdated entries land in place; the frame is
+    # built from the reordered arrays with no per-row Python objects
+    order = np.lexsort((cols["id"], cols["date"]))[::-1]
+    df_log = pd.DataFrame({
+        "date": np.datetime_as_string(cols["date"][order]),
+        "type": TYPE_LABELS_BY_CODE[cols["type"][order]],
+        "amount": cols["amount"][order],
+        "delete": False,
+    })
+    return df_log, cols["id"][order].tolist()
+
+def get_log_table():
+    # sorted once per add/delete, not on every fragment rerun
+    return cached_on_version("_log_cache", lambda: build_log_table(st.session_state.transactions))
+
+def delete_txns(txn_ids: set):
+    # one vectorized mask over the id column for the whole batch
+    def drop_ids(cols):
+        keep = ~np.isin(cols["id"], list(txn_ids))
+        return {k: v[keep] for k, v in cols.items()}
+    commit_txns(drop_ids)
+
+def delete_ticked_rows(editor_key: str, row_ids: list) -> bool:
+    # data_editor reports edits by row position; map ticked positions back to ids
+    edited = st.session_state[editor_key]["edited_rows"]
+    ticked = {row_ids[pos] for pos, change in edited.items() if change.get("delete")}
+    if ticked:
+        delete_txns(ticked)
+    return bool(ticked)
+
+def clear_txns():
+    commit_txns(lambda cols: empty_txns())
+    st.session_state.confirming_clear = False
+    st.session_state.log_notice = "All transactions cleared."  # shown once, after the rerun
+
+@st.fragment
+def render_txn_log():
+    # Opening / cancelling the clear-all confirmation reruns only this fragment. Deletes
+    # and clear-all change the data behind the meter, metrics and summary, so those
+    # follow up with a full st.rerun() to redraw them.
+    head_left, head_right = st.columns([1, 0.08])
+    with head_left:
+        st.subheader("🧾 Logged transactions")
+        st.caption("Most recent first. Tick ✖ on rows, then Delete selected.")
+
+    with head_right:
+        # Bomb icon toggles confirm UI
+        if not st.session_state.confirming_clear:
+            if st.button("💣", help="Clear all transactions"):
+                st.session_state.confirming_clear = True
+        else:
+            pass  # confirmation card will render below list
 
-df_all = df_from_txns(st.session_state.transactions)
+    n_txns = txn_count()
 
-with st.expander(f"Show transactions ({len(st.session_state.transactions)})", expanded=st.session_state.log_open):
-    # Remember their choice
-    st.session_state.log_open = True
-    if df_all.empty:
-        st.info("No transactions yet. Add your first deposit to get started.")
-    else:
-        df_log = df_all.sort_values(by="date", ascending=False).copy()
-        for _, row in df_log.iterrows():
-            line = st.container(border=True)
-            with line:
-                c1, c2, c3, c4 = st.columns([1.2, 1, 1, 0.4])
-                c1.write(f"**{row['date'].strftime('%Y-%m-%d')}**")
-                if row["type"] == "deposit":
-                    c2.markdown(f"<span style='color:#22c55e;'>💵 Deposit</span>", unsafe_allow_html=True)
-                else:
-                    c2.markdown(f"<span style='color:#ef4444;'>🔻 Withdrawal</span>", unsafe_allow_html=True)
-                c3.write(f"${row['amount']:,.2f}")
-                if c4.button("✖", key=f"del_{int(row['id'])}", help="Delete this transaction"):
-                    # delete by ID (no rerun -> keeps expander open)
-                    st.session_state.transactions = [tx for tx in st.session_state.transactions if tx["id"] != int(row["id"])]
-                    # force re-render of this block by just writing a tiny placeholder
-                    st.write("")
-
-        # Inline clear-all confirmation (appears under the bomb)
-        if st.session_state.confirming_clear:
-            st.write("")
-            st.markdown('<div class="danger-card">Delete all transactions? This cannot be undone.</div>', unsafe_allow_html=True)
-            cc1, cc2 = st.columns([0.16, 0.18])
-            with cc1:
-                if st.button("Yes, delete all", type="primary"):
-                    st.session_state.transactions = []
-                    st.session_state.confirming_clear = False
-                    st.success("All transactions cleared.")
-            with cc2:
-                if st.button("No, keep them"):
-                    st.session_state.confirming_clear = False
+    with st.expander(f"Show transactions ({n_txns})", expanded=st.session_state.log_open):
+        # Remember their choice
+        st.session_state.log_open = True
+        if "log_notice" in st.session_state:
+            st.success(st.session_state.pop("log_notice"))
+        if not n_txns:
+            st.info("No transactions yet. Add your first deposit to get started.")
+        else:
+            df_log, row_ids = get_log_table()
+            # One editor for the whole log instead of a container + columns + button per row.
+            # Keyed on txn_version so each change starts from a fresh (unticked) editor.
+            editor_key = f"txn_log_{st.session_state.txn_version}"
+            # Inside a form, ticks stay client-side until submit: any number of rows
+            # are deleted in one rerun instead of one rerun per tick
+            with st.form("txn_log_form", border=False):
+                st.data_editor(
+                    df_log,
+                    key=editor_key,
+                    column_config={
+                        "date": st.column_config.TextColumn("Date"),
+                        "type": st.column_config.TextColumn("Type"),
+                        "amount": st.column_config.NumberColumn("Amount", format="dollar"),
+                        "delete": st.column_config.CheckboxColumn("✖", help="Delete this transaction"),
+                    },
+                    disabled=["date", "type", "amount"],
+                    hide_index=True,
+                    width="stretch",
+                )
+                if st.form_submit_button("Delete selected") and delete_ticked_rows(editor_key, row_ids):
+                    st.rerun()
+
+            # Inline clear-all confirmation (appears under the bomb)
+            if st.session_state.confirming_clear:
+                st.write("")
+                st.markdown('<div class="danger-card">Delete all transactions? This cannot be undone.</div>', unsafe_allow_html=True)
+                cc1, cc2 = st.columns([0.16, 0.18])
+                with cc1:
+                    if st.button("Yes, delete all", type="primary"):
+                        clear_txns()
+                        st.rerun()
+                with cc2:
+                    if st.button("No, keep them"):
+                        st.session_state.confirming_clear = False
+
+render_txn_log()
 
 # =========================
 # ------- Analytics -------
 # =========================
-st.subheader("📊 Monthly Summary")
-
-df_all = df_from_txns(st.session_state.transactions)
-if df_all.empty:
-    st.info("No data yet. Add a transaction to see summary and charts.")
-else:
-    # Current-year monthly summary
-    df_curr = df_all[df_all["year"] == current_year].copy()
-    monthly = (
-        df_curr.groupby(["month", "type"])["amount"]
-        .sum()
-        .unstack()
-        .reindex(columns=["deposit", "withdrawal"], fill_value=0.0)
-        .fillna(0.0)
-        .reset_index()
-    )
-
-    # Room math (deposits consume room; withdrawals don't restore in-year)
-    total_room_this_year = (carryover_prior + current_year_limit(current_year)) if st.session_state.ever_contributed == "Yes" \
-        else (total_room_from_inception(dob, current_year) - total_room_from_inception(dob, current_year - 1) + carryover_prior if current_year > 2009 else current_year_limit(current_year))
-
-    monthly["net_contribution"] = monthly["deposit"]
-    monthly["cumulative_contribution"] = monthly["deposit"].cumsum()
-    monthly["room_left"] = (total_room_this_year - monthly["cumulative_contribution"]).clip(lower=0.0)
+def render_analytics():
+    if not txn_count():
+        st.info("No data yet. Add a transaction to see summary and charts.")
+        return
+
+    # Current-year month x type sums, rebuilt only when transactions change. This
+    # is already the shape st.bar_chart wants, so no reshaping before the chart.
+    monthly = get_monthly(current_year)
+    if monthly.empty:
+        # only past-year transactions: nothing to chart or tabulate
+        st.info(f"No {current_year} transactions yet.")
+        return
 
     # Intuitive chart: deposits (green) vs withdrawals (red)
     st.bar_chart(
-        monthly.set_index("month")[["deposit", "withdrawal"]],
-        use_container_width=True,
+        monthly,
+        color=["#22c55e", "#ef4444"],   # column order: deposit, withdrawal
+        width="stretch",
+    )
+
+    # The wide table (cumulative / room-left columns) is only built while toggled on
+    # (a toggle rather than a nested expander, which Streamlit doesn't allow)
+    if not st.toggle("Show table", key="show_table_open"):
+        return
+
+    # Room math (deposits consume room; withdrawals don't restore in-year).
+    # Holds for both estimator branches: carryover_prior already excludes this year's limit.
+    total_room_this_year = carryover_prior + current_year_limit(current_year)
+
+    deposits = monthly["deposit"].to_numpy()
+    cumulative = np.cumsum(deposits)
+    table = monthly.reset_index().assign(
+        net_contribution=deposits,
+        cumulative_contribution=cumulative,
+        room_left=np.maximum(total_room_this_year - cumulative, 0.0),
+    )
+    # Currency formatting is applied client-side by column_config (no Styler,
+    # which renders every cell to an HTML string on the server)
+    st.dataframe(
+        table,
+        column_config={
+            "deposit": st.column_config.NumberColumn("deposit", format="dollar"),
+            "withdrawal": st.column_config.NumberColumn("withdrawal", format="dollar"),
+            "net_contribution": st.column_config.NumberColumn("net_contribution", format="dollar"),
+            "cumulative_contribution": st.column_config.NumberColumn("cumulative_contribution", format="dollar"),
+            "room_left": st.column_config.NumberColumn("room_left", format="dollar"),
+        },
+        width="stretch",
+        hide_index=True
     )
 
-    with st.expander("Show table", expanded=st.session_state.show_table_open):
-        st.session_state.show_table_open = True
-        # Compact table with currency formatting
-        fmt = {
-            "deposit": "${:,.2f}",
-            "withdrawal": "${:,.2f}",
-            "net_contribution": "${:,.2f}",
-            "cumulative_contribution": "${:,.2f}",
-            "room_left": "${:,.2f}",
-        }
-        st.dataframe(
-            monthly.style.format(fmt),
-            use_container_width=True,
-            hide_index=True
-        )
+# Collapsed by default: while closed, the chart and table aren't built or sent at all
+summary_exp = st.expander("📊 Monthly Summary", key="summary_open", on_change="rerun")
+if summary_exp.open:
+    with summary_exp:
+        render_analytics()